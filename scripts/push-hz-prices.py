@@ -18,14 +18,15 @@ Optional env:
   COROOT_PROJECT   — Project name override (auto-discovered from API if unset)
 """
 
-import http.cookiejar
-import json
 import os
 import random
+import shutil
 import sys
 import time
-import urllib.error
-import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import ijson
+import requests
 
 # --- Config ---
 
@@ -51,7 +52,7 @@ MAX_RETRIES = 5
 BASE_DELAY = 5       # seconds — first retry after ~5s
 MAX_DELAY = 60       # seconds — cap for exponential backoff
 
-# urllib timeout= is a per-socket-operation timeout (covers both connect and read).
+# requests timeout= is a per-socket-operation timeout (covers connect and each read).
 # Coroot is on a small VPS that may be slow to respond — use a shorter timeout to
 # fail fast and let the retry loop handle recovery. Hetzner API is reliable but may
 # return larger payloads, so it gets a longer timeout.
@@ -61,13 +62,24 @@ COROOT_TIMEOUT = 15   # seconds — small VPS, fail fast on unreachable
 # HTTP status codes worth retrying (server temporarily unavailable)
 RETRYABLE_HTTP_CODES = {429, 500, 502, 503, 504}
 
+# Local cache for the Hetzner pricing catalog. The catalog rarely changes
+# between runs, so we revalidate with If-None-Match and skip the multi-MB
+# download on 304. In CI the directory is persisted via actions/cache.
+CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "coroot-cicd"
+)
+PRICING_CACHE = os.path.join(CACHE_DIR, "hetzner-pricing.json")
+PRICING_CACHE_ETAG = PRICING_CACHE + ".etag"
+PRICING_CACHE_MAX_AGE = 6 * 3600  # seconds — freshness window when no ETag
+
 
 def _is_retryable(exc):
     """Return True if *exc* is a transient error worth retrying."""
-    if isinstance(exc, urllib.error.HTTPError):
-        return exc.code in RETRYABLE_HTTP_CODES
-    # Network-level errors (timeout, connection refused, SSL) are always transient
-    return isinstance(exc, (urllib.error.URLError, TimeoutError, OSError))
+    if isinstance(exc, requests.HTTPError):
+        return exc.response is not None and exc.response.status_code in RETRYABLE_HTTP_CODES
+    # Network-level errors (timeout, connection refused, SSL) are always
+    # transient; requests exceptions subclass OSError and land here too
+    return isinstance(exc, (TimeoutError, OSError))
 
 
 def _retry(fn, description: str):
@@ -78,7 +90,7 @@ def _retry(fn, description: str):
     for attempt in range(MAX_RETRIES):
         try:
             return fn()
-        except (urllib.error.URLError, TimeoutError, OSError) as exc:
+        except (TimeoutError, OSError) as exc:
             if not _is_retryable(exc):
                 raise
             if attempt == MAX_RETRIES - 1:
@@ -91,62 +103,154 @@ def _retry(fn, description: str):
             time.sleep(actual_delay)
 
 
+# Shared HTTP session — one urllib3 pool manager underneath, keeping a
+# keep-alive pool per host. Both Hetzner calls reuse one TLS connection to
+# api.hetzner.cloud, and the Coroot flow (login → projects → pricing POST)
+# reuses another; the Coroot auth cookie persists in session.cookies.
+_session = requests.Session()
+
+
 def hetzner_get(path: str) -> dict:
     def _do():
-        req = urllib.request.Request(
+        resp = _session.get(
             f"https://api.hetzner.cloud{path}",
             headers={"Authorization": f"Bearer {HETZNER_TOKEN}"},
+            timeout=HETZNER_TIMEOUT,
         )
-        with urllib.request.urlopen(req, timeout=HETZNER_TIMEOUT) as resp:
-            return json.loads(resp.read())
+        resp.raise_for_status()
+        return resp.json()
     return _retry(_do, f"GET {path}")
 
 
-# Coroot session — cookie jar persists the auth cookie across requests
-_jar = http.cookiejar.CookieJar()
-_opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(_jar))
+def _stream_price_lookup(
+    fp, needed_pairs: set[tuple[str, str]]
+) -> dict[tuple[str, str], tuple[float, float]]:
+    """Incrementally parse a pricing catalog stream, keeping *needed_pairs*.
+
+    Only the (server_type, location) cells occupied by active servers are
+    materialized — O(needed) dict inserts instead of every type × location
+    in the catalog. The result is a single flat dict keyed by the pair
+    (one hash lookup per server, no nested dicts), with (hourly, monthly)
+    net-price tuples as values.
+    """
+    needed_types = {stype for stype, _ in needed_pairs}
+    lookup: dict[tuple[str, str], tuple[float, float]] = {}
+    for st in ijson.items(fp, "pricing.server_types.item"):
+        name = st["name"]
+        if name not in needed_types:
+            continue
+        for p in st["prices"]:
+            key = (name, p["location"])
+            if key in needed_pairs:
+                lookup[key] = (
+                    float(p["price_hourly"]["net"]),
+                    float(p["price_monthly"]["net"]),
+                )
+    return lookup
+
+
+def hetzner_stream_price_lookup(f_servers) -> dict[tuple[str, str], tuple[float, float]]:
+    """Fetch /v1/pricing into a price lookup for the cells we use.
+
+    The full catalog (every server type × every location) is a multi-MB
+    document; parsing it incrementally with ijson avoids holding the raw
+    bytes and the fully parsed dict in memory at once. The payload is
+    cached on disk and revalidated with If-None-Match, so an unchanged
+    catalog costs one sub-KB HTTP exchange and a parse from local disk.
+    *f_servers* is the in-flight future for the /v1/servers fetch — it is
+    awaited only once a catalog source is at hand, to learn which
+    (server_type, location) pairs to keep.
+    """
+    def _needed_pairs() -> set[tuple[str, str]]:
+        return {
+            (s["server_type"]["name"], s["datacenter"]["location"]["name"])
+            for s in f_servers.result()["servers"]
+        }
+
+    def _do():
+        cached_etag = None
+        if os.path.exists(PRICING_CACHE):
+            try:
+                with open(PRICING_CACHE_ETAG) as f:
+                    cached_etag = f.read().strip() or None
+            except OSError:
+                cached_etag = None
+            if cached_etag is None and (
+                time.time() - os.path.getmtime(PRICING_CACHE) < PRICING_CACHE_MAX_AGE
+            ):
+                # No validator from the last fetch — trust a recent copy.
+                print("  Using cached pricing catalog (fresh, no ETag)")
+                with open(PRICING_CACHE, "rb") as f:
+                    return _stream_price_lookup(f, _needed_pairs())
+
+        headers = {"Authorization": f"Bearer {HETZNER_TOKEN}"}
+        if cached_etag:
+            headers["If-None-Match"] = cached_etag
+        with _session.get(
+            "https://api.hetzner.cloud/v1/pricing",
+            headers=headers,
+            timeout=HETZNER_TIMEOUT,
+            stream=True,
+        ) as resp:
+            if resp.status_code == 304:
+                print("  Pricing catalog unchanged (304) — using cached copy")
+                with open(PRICING_CACHE, "rb") as f:
+                    return _stream_price_lookup(f, _needed_pairs())
+            resp.raise_for_status()
+
+            # Spool the payload to the cache atomically, then stream-parse
+            # from disk — keeps the single-pass memory profile and leaves a
+            # valid copy behind for the next run's conditional GET.
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            tmp = PRICING_CACHE + ".tmp"
+            resp.raw.decode_content = True  # un-gzip transparently while spooling
+            with open(tmp, "wb") as f:
+                shutil.copyfileobj(resp.raw, f)
+            os.replace(tmp, PRICING_CACHE)
+            etag = resp.headers.get("ETag")
+        if etag:
+            with open(PRICING_CACHE_ETAG, "w") as f:
+                f.write(etag)
+        else:
+            try:
+                os.remove(PRICING_CACHE_ETAG)
+            except FileNotFoundError:
+                pass
+        with open(PRICING_CACHE, "rb") as f:
+            return _stream_price_lookup(f, _needed_pairs())
+    return _retry(_do, "GET /v1/pricing (stream)")
 
 
 def coroot_request(method: str, path: str, body: dict | None = None) -> dict | None:
     def _do():
-        data = json.dumps(body).encode() if body is not None else None
-        headers = {"Content-Type": "application/json"} if data else {}
-        req = urllib.request.Request(
+        resp = _session.request(
+            method,
             f"{COROOT_URL}{path}",
-            data=data,
-            method=method,
-            headers=headers,
+            json=body,
+            timeout=COROOT_TIMEOUT,
         )
-        try:
-            with _opener.open(req, timeout=COROOT_TIMEOUT) as resp:
-                raw = resp.read()
-                return json.loads(raw) if raw.strip() else None
-        except urllib.error.HTTPError as e:
-            body_text = e.read().decode(errors="replace").strip()
-            if e.code in RETRYABLE_HTTP_CODES:
-                raise  # let _retry handle 429/5xx
-            raise RuntimeError(f"HTTP {e.code} {method} {path}: {body_text}") from e
+        if resp.status_code in RETRYABLE_HTTP_CODES:
+            resp.raise_for_status()  # let _retry handle 429/5xx
+        if not resp.ok:
+            raise RuntimeError(
+                f"HTTP {resp.status_code} {method} {path}: {resp.text.strip()}"
+            )
+        return resp.json() if resp.content.strip() else None
     return _retry(_do, f"{method} {path}")
 
 
 # --- 1. Fetch Hetzner pricing ---
 
-print("Fetching Hetzner pricing catalog...")
-pricing = hetzner_get("/v1/pricing")["pricing"]
-
-price_lookup: dict[str, dict[str, dict]] = {
-    st["name"]: {
-        p["location"]: {
-            "hourly": float(p["price_hourly"]["net"]),
-            "monthly": float(p["price_monthly"]["net"]),
-        }
-        for p in st["prices"]
-    }
-    for st in pricing["server_types"]
-}
-
-print("Fetching active servers...")
-servers = hetzner_get("/v1/servers")["servers"]
+# The pricing catalog and server list are independent — fetch them
+# concurrently so the two request latencies overlap (both are I/O bound).
+# The pricing worker stream-decodes the catalog, keeping only the
+# (server_type, location) cells the account's servers actually occupy.
+print("Fetching Hetzner pricing catalog and active servers...")
+with ThreadPoolExecutor(max_workers=2) as ex:
+    f_servers = ex.submit(hetzner_get, "/v1/servers")
+    f_pricing = ex.submit(hetzner_stream_price_lookup, f_servers)
+    servers = f_servers.result()["servers"]
+    price_lookup = f_pricing.result()
 
 if not servers:
     sys.exit("error: no active servers found in Hetzner account")
@@ -159,22 +263,24 @@ total_ram_gb = 0.0
 
 print()
 for server in servers:
-    stype = server["server_type"]["name"]
-    vcpus = server["server_type"]["cores"]
-    ram_gb = server["server_type"]["memory"]
+    st = server["server_type"]
+    stype = st["name"]
+    vcpus = st["cores"]
+    ram_gb = st["memory"]
     location = server["datacenter"]["location"]["name"]
-    prices = price_lookup.get(stype, {}).get(location)
+    prices = price_lookup.get((stype, location))
 
     if not prices:
         print(f"  {server['name']}: no price found for {stype}@{location}, skipping")
         continue
 
-    total_hourly += prices["hourly"]
+    hourly, monthly = prices
+    total_hourly += hourly
     total_vcpus += vcpus
     total_ram_gb += ram_gb
     print(
         f"  {server['name']}: {stype} @ {location}"
-        f" — {prices['monthly']:.4f} EUR/mo, {vcpus} vCPU, {ram_gb:.0f} GB RAM"
+        f" — {monthly:.4f} EUR/mo, {vcpus} vCPU, {ram_gb:.0f} GB RAM"
     )
 
 if total_vcpus == 0:
@@ -216,16 +322,23 @@ if not COROOT_PROJECT:
         else:
             raise ValueError("empty projects list")
     except Exception as e:
-        print(f"  /api/projects unavailable ({e}), probing overview endpoints...")
+        print(f"  /api/projects unavailable ({e}), probing project endpoints...")
         for candidate in ("default",):
+            # A HEAD on the project route is enough to test existence —
+            # the overview endpoint aggregates cluster state server-side
+            # and is only worth hitting as a last resort (e.g. older
+            # Coroot builds that reject HEAD). Any 2xx counts as "exists";
+            # coroot_request raises RuntimeError otherwise.
             try:
-                resp = coroot_request("GET", f"/api/project/{candidate}/overview")
-                if resp is not None:
-                    COROOT_PROJECT = candidate
-                    print(f"  Using: {COROOT_PROJECT}")
-                    break
+                coroot_request("HEAD", f"/api/project/{candidate}")
             except RuntimeError:
-                pass
+                try:
+                    coroot_request("GET", f"/api/project/{candidate}/overview")
+                except RuntimeError:
+                    continue
+            COROOT_PROJECT = candidate
+            print(f"  Using: {COROOT_PROJECT}")
+            break
         else:
             sys.exit(
                 "error: could not auto-discover project name. "